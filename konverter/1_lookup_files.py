@@ -1,9 +1,12 @@
 import os
 import re
+import io
+import json
 import pandas as pd
 from pathlib import Path
 
 from config import MODEL_RESULTS_FOLDER
+from archive_utils import strip_compression, split_archive_path, list_zip_members, open_input, read_head
 # -------- Konfigurierbare Parameter --------
 # Basispfad: Ordner des Skripts
 BASE_DIR = Path(__file__).resolve().parent
@@ -12,21 +15,26 @@ BASE_DIR = Path(__file__).resolve().parent
 # INPUT_DIR = BASE_DIR.parent / 'input' / 'POC_2.0_2025.10'
 INPUT_DIR = Path(MODEL_RESULTS_FOLDER)
 OUTPUT_EXCEL = BASE_DIR.parent / 'overview_files_unsorted.xlsx'
+# Merkt sich Größe und Änderungszeit aller gescannten Dateien (nur neue/geänderte werden neu gelesen)
+MANIFEST_FILE = BASE_DIR.parent / 'overview_files_manifest.json'
+# Nur CSV und Excel (auch als .gz/.zst oder innerhalb von .zip-Archiven)
+FILE_EXTENSIONS = ['.csv', '.xls', '.xlsx']
 # ------------------------------------------
 
 def get_excel_sheets_and_columns(filepath: Path):
-    """Liest alle Sheetnamen und Spaltenüberschriften aus einer Excel-Datei."""
+    """Liest alle Sheetnamen und Spaltenüberschriften aus einer Excel-Datei (auch aus Archiven)."""
     try:
-        xls = pd.ExcelFile(filepath)
-        sheet_info = []
-        for sheet in xls.sheet_names:
-            try:
-                df = xls.parse(sheet, nrows=1)
-                cols = ', '.join([str(col) for col in df.columns])
-            except Exception:
-                cols = ''
-            sheet_info.append((sheet, cols))
-        return sheet_info
+        with open_input(filepath, seekable=True) as f:
+            xls = pd.ExcelFile(f)
+            sheet_info = []
+            for sheet in xls.sheet_names:
+                try:
+                    df = xls.parse(sheet, nrows=1)
+                    cols = ', '.join([str(col) for col in df.columns])
+                except Exception:
+                    cols = ''
+                sheet_info.append((sheet, cols))
+            return sheet_info
     except Exception:
         return []
 
@@ -34,14 +42,23 @@ def get_csv_columns(filepath: Path):
     """
     Liest die erste Zeile einer CSV-Datei, um Spaltennamen zu ermitteln.
     Robuste Fallbacks für Delimiter und Encoding.
+    Bei komprimierten Dateien wird nur der Anfang der Datei entpackt.
     """
     seps = [None, ';', ',']
     encodings = [None, 'utf-8-sig', 'latin-1']
 
+    try:
+        head = read_head(filepath)
+    except Exception:
+        return ''
+    # nur vollständige Zeilen verwenden
+    if b'\n' in head:
+        head = head[:head.rfind(b'\n') + 1]
+
     for enc in encodings:
         for sep in seps:
             try:
-                df = pd.read_csv(filepath, nrows=1, sep=sep, engine='python', encoding=enc)
+                df = pd.read_csv(io.BytesIO(head), nrows=1, sep=sep, engine='python', encoding=enc)
                 return ', '.join([str(col) for col in df.columns])
             except Exception:
                 continue
@@ -66,6 +83,97 @@ def derive_source_model(input_dir: Path, file_root: Path) -> str:
     else:
         return input_dir.name
 
+def load_manifest(manifest_file: Path):
+    """Liest das Scan-Manifest {relativer Pfad: {'size': ..., 'mtime': ...}} (leer beim ersten Lauf)."""
+    if not manifest_file.is_file():
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        print(f'⚠️ Manifest {manifest_file} nicht lesbar, alle Dateien werden neu gescannt.')
+        return {}
+
+def save_manifest(manifest_file: Path, manifest: dict):
+    """Schreibt das Scan-Manifest (erst temporär, dann ersetzen)."""
+    tmp_file = manifest_file.with_suffix('.tmp')
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, manifest_file)
+
+def list_files(input_dir: Path):
+    """
+    Sammelt alle CSV-/Excel-Dateien und Archive unter input_dir, ohne sie zu öffnen.
+    Rückgabe: {relativer Pfad: (Pfad, Source model, File location, size, mtime)}
+    """
+    files_found = {}
+    for root, dirs, files in os.walk(input_dir):
+        root_path = Path(root)
+        # Relativer Pfad vom INPUT_DIR
+        try:
+            rel_root = root_path.relative_to(input_dir)
+            file_location = str(rel_root) if str(rel_root) != '.' else ''
+        except Exception:
+            file_location = ''
+
+        source_model = derive_source_model(input_dir, root_path)
+
+        for file in files:
+            path = root_path / file
+            is_zip = path.suffix.lower() == '.zip'
+            if not is_zip and Path(strip_compression(path.name)).suffix.lower() not in FILE_EXTENSIONS:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            key = (Path(file_location) / path.name).as_posix()
+            # Archiv direkt im INPUT_DIR: Archivname ist der Modellname
+            model = path.stem if is_zip and not file_location else source_model
+            files_found[key] = (path, model, file_location, stat.st_size, stat.st_mtime_ns)
+    return files_found
+
+def scan_file(path: Path, source_model: str, file_location: str):
+    """
+    Liest Sheetnamen und Spaltenüberschriften einer Datei und liefert die Zeilen für die Übersicht.
+    .zip-Archive werden wie Ordner behandelt: File location = '<Ordner>/<archiv.zip>/<Unterordner>'.
+    """
+    if path.suffix.lower() == '.zip':
+        rows = []
+        try:
+            members = list_zip_members(path, FILE_EXTENSIONS)
+        except Exception:
+            return rows
+        for member in members:
+            member_path = Path(member)
+            location = Path(file_location) / path.name / member_path.parent
+            rows.extend(scan_file(path / member_path, source_model, str(location)))
+        return rows
+
+    rows = []
+    try:
+        if Path(strip_compression(path.name)).suffix.lower() in ['.xls', '.xlsx']:
+            for sheet, columns in get_excel_sheets_and_columns(path):
+                rows.append({
+                    'Source model': source_model,
+                    'File location': file_location,
+                    'File name': path.name,
+                    'Sheet name': sheet,
+                    'Column names': columns
+                })
+        else:
+            rows.append({
+                'Source model': source_model,
+                'File location': file_location,
+                'File name': path.name,
+                'Sheet name': '',
+                'Column names': get_csv_columns(path)
+            })
+    except Exception:
+        # Einzeldateiprobleme ignorieren
+        pass
+    return rows
+
 def main():
     print(f'INPUT_DIR: {INPUT_DIR}')
     if not INPUT_DIR.is_dir():
@@ -77,65 +185,88 @@ def main():
                 print('-', p.name, '(DIR)' if p.is_dir() else '')
         return
 
-    rows = []
+    cols = ['Source model', 'File location', 'File name', 'Sheet name', 'Column names']
+    key_cols = ['File location', 'File name', 'Sheet name']
 
-    for root, dirs, files in os.walk(INPUT_DIR):
-        root_path = Path(root)
-        # Relativer Pfad vom INPUT_DIR
-        try:
-            rel_root = root_path.relative_to(INPUT_DIR)
-            file_location = str(rel_root) if str(rel_root) != '.' else ''
-        except Exception:
-            file_location = ''
+    # Bisherige Übersicht (inkl. manueller Ergänzungen) und Manifest laden
+    manifest = load_manifest(MANIFEST_FILE)
+    if OUTPUT_EXCEL.is_file():
+        df_old = pd.read_excel(OUTPUT_EXCEL, dtype={c: str for c in cols})
+        df_old[cols] = df_old[cols].fillna('')
+    else:
+        df_old = pd.DataFrame(columns=cols)
+    # bereits als entfernt markierte Zeilen bleiben markiert, bis die Datei wieder auftaucht
+    was_removed = df_old.get('Scan status', pd.Series('', index=df_old.index)).fillna('') == 'removed'
+    df_old = df_old.drop(columns=['Scan status'], errors='ignore')
+    # Schlüssel ist die physische Datei (bei Dateien in .zip-Archiven das Archiv)
+    df_old['_path'] = [split_archive_path(Path(loc) / name)[0].as_posix()
+                       for loc, name in zip(df_old['File location'], df_old['File name'])]
 
-        source_model = derive_source_model(INPUT_DIR, root_path)
+    files_found = list_files(INPUT_DIR)
+    known_paths = set(df_old['_path'])
 
-        for file in files:
-            path = root_path / file
-            ext = path.suffix.lower()
+    status = {}
+    for key, (path, source_model, file_location, size, mtime) in files_found.items():
+        entry = manifest.get(key)
+        if entry is None:
+            status[key] = 'new'
+        elif entry.get('size') != size or entry.get('mtime') != mtime:
+            status[key] = 'changed'
+        elif key not in known_paths:
+            # unverändert, aber nicht (mehr) in der Übersicht -> neu einlesen
+            status[key] = 'rescan'
+        else:
+            status[key] = ''
 
-            # Nur CSV und Excel
-            if ext not in ['.csv', '.xls', '.xlsx']:
-                continue
+    to_scan = [key for key, st in status.items() if st]
+    removed = set(manifest) - set(files_found)
+    print(f'{len(files_found)} Dateien gefunden: '
+          f'{sum(st == "new" for st in status.values())} neu, '
+          f'{sum(st == "changed" for st in status.values())} geändert, '
+          f'{len(removed)} entfernt, {len(files_found) - len(to_scan)} unverändert.')
 
-            try:
-                if ext in ['.xls', '.xlsx']:
-                    sheets = get_excel_sheets_and_columns(path)
-                    for sheet, columns in sheets:
-                        rows.append({
-                            'Source model': source_model,
-                            'File location': file_location,
-                            'File name': path.name,
-                            'Sheet name': sheet,
-                            'Column names': columns
-                        })
-                elif ext == '.csv':
-                    columns = get_csv_columns(path)
-                    rows.append({
-                        'Source model': source_model,
-                        'File location': file_location,
-                        'File name': path.name,
-                        'Sheet name': '',
-                        'Column names': columns
-                    })
-            except Exception:
-                # Einzeldateiprobleme ignorieren
-                continue
+    rows = []
+    for key in to_scan:
+        path, source_model, file_location, _, _ = files_found[key]
+        for row in scan_file(path, source_model, file_location):
+            row['_path'] = key
+            row['Scan status'] = status[key] if status[key] != 'rescan' else ''
+            rows.append(row)
+    df_scanned = pd.DataFrame(rows, columns=cols + ['_path', 'Scan status'])
+
+    # Unveränderte Dateien: bisherige Zeilen unverändert übernehmen
+    rescanned = df_old['_path'].isin(to_scan)
+    df_kept = df_old.loc[~rescanned].copy()
+    df_kept['Scan status'] = ''
+    df_kept.loc[~df_kept['_path'].isin(files_found) | was_removed[~rescanned], 'Scan status'] = 'removed'
+
+    # Neu gescannte Dateien: manuelle Spalten der bisherigen Zeilen übernehmen
+    df_prev = df_old.loc[rescanned]
+    annotations = df_prev.drop(columns=['Source model', 'Column names', '_path'])
+    df_scanned = df_scanned.merge(annotations, on=key_cols, how='left')
+    df_gone = df_prev.merge(df_scanned[key_cols], on=key_cols, how='left', indicator=True)
+    df_gone = df_gone.loc[df_gone['_merge'] == 'left_only'].drop(columns='_merge')
+    df_gone['Scan status'] = 'removed'  # z.B. Sheet aus geänderter Datei entfernt
 
-    if not rows:
+    df = pd.concat([df_kept, df_scanned, df_gone], ignore_index=True)
+    if df.empty:
         print('⚠️ Keine passenden Dateien gefunden oder keine lesbaren Spalten ermittelt. Es wurde keine Excel-Datei geschrieben.')
         return
 
     # Export
     try:
-        df = pd.DataFrame(rows)
-        # Spalten explizit ordnen
-        cols = ['Source model', 'File location', 'File name', 'Sheet name', 'Column names']
-        df = df[cols]
+        # Spalten explizit ordnen, manuelle Zusatzspalten dahinter
+        extra_cols = [c for c in df.columns if c not in cols + ['_path', 'Scan status']]
+        df = df.sort_values(['Source model', 'File location', 'File name', 'Sheet name'], kind='stable')
+        df = df[cols + ['Scan status'] + extra_cols]
         df.to_excel(OUTPUT_EXCEL, index=False)
 
         if OUTPUT_EXCEL.is_file() and OUTPUT_EXCEL.stat().st_size > 0:
             print(f'✓ Excel-Datei gespeichert unter: {OUTPUT_EXCEL}')
+            save_manifest(MANIFEST_FILE, {
+                key: {'size': size, 'mtime': mtime}
+                for key, (_, _, _, size, mtime) in files_found.items()
+            })
         else:
             print('✗ Export schien zu laufen, aber die Datei ist nicht entstanden oder leer.')
     except PermissionError:
@@ -1,10 +1,14 @@
 #%%
 import pandas as pd
-import os, sys, time, gc
+import os, re, sys, time, gc, argparse, fnmatch
 import numpy as np
+from scipy import sparse
 # from collections import defaultdict, Counter
+from collections import namedtuple
 from pathlib import Path
 from colorama import Fore, Style, init
+from archive_utils import strip_compression, open_input
+from store_utils import write_partitions
 init(autoreset=True)
 
 start_time = time.time()
@@ -24,6 +28,27 @@ COLUMN_ALIASES = {
     "unit":     ["Unit", "unit"],
 }
 
+# Filters from config.py can be overridden on the command line
+parser = argparse.ArgumentParser(description='Convert model results into pyam format.')
+parser.add_argument('--model', nargs='+', help='only these models (source or target names, * as wildcard)')
+parser.add_argument('--scenario', nargs='+', help='only these scenarios')
+parser.add_argument('--region', nargs='+', help='only these regions')
+parser.add_argument('--year', nargs='+', type=int, help='only these years')
+parser.add_argument('--variable', nargs='+', help='only these variables')
+# parse_known_args keeps the script runnable in an interactive window (#%%), where the
+# kernel passes its own '--f=...' argument; any other unknown option is a typo and must
+# not silently result in a full, unfiltered run
+args, unknown = parser.parse_known_args()
+unknown_options = [a for a in unknown if a.startswith('--') and not a.startswith('--f=')]
+if unknown_options:
+    parser.error(f"unrecognized arguments: {' '.join(unknown_options)}")
+
+filter_models    = args.model or FILTER_MODELS
+filter_scenarios = args.scenario or FILTER_SCENARIOS
+filter_regions   = args.region or FILTER_REGIONS
+filter_years     = args.year or FILTER_YEARS
+filter_variables = args.variable or FILTER_VARIABLES
+
 # ============================================================
 # HELPER FUNCTIONS
 # ============================================================
@@ -52,6 +77,117 @@ COLUMN_ALIASES = {
 #             print(line)
 #             error_log.append(line)
 
+# exact keys first, then normalized keys (casefold, collapsed whitespace, canonical '|')
+LookupIndex = namedtuple('LookupIndex', ['exact', 'normalized', 'casefold'])
+
+def normalize_keys(series, casefold=True):
+    """
+    Normalizes keys vectorially: casefold (optional), collapsed whitespace,
+    no spaces around '|'.
+    """
+    series = series.astype('string')
+    if casefold:
+        series = series.str.casefold()
+    return (
+        series
+        .str.replace(r'\s+', ' ', regex=True)
+        .str.replace(r' ?\| ?', '|', regex=True)
+        .str.strip()
+    )
+
+def build_lookup_index(mapping_dict, label, error_log, casefold=True):
+    """
+    Compiles a mapping dictionary into a two-level LookupIndex (exact and normalized keys).
+    Keys that normalize to the same value but map to different targets are
+    reported and only kept for exact matching. Use casefold=False where case
+    carries meaning (units: 'mt' vs. 'Mt').
+    """
+    keys = pd.Series(list(mapping_dict.keys()), dtype=object)
+    targets = pd.Series(list(mapping_dict.values()), dtype=object)
+    df = pd.DataFrame({'key': keys, 'normalized': normalize_keys(keys, casefold), 'target': targets.astype(str)})
+    df = df.dropna(subset=['normalized'])
+
+    n_targets = df.groupby('normalized')['target'].transform('nunique')
+    ambiguous = df.loc[n_targets > 1].sort_values('normalized')
+    if not ambiguous.empty:
+        msg_header = (f"[Dictionary] {ambiguous['normalized'].nunique()} {label} keys are ambiguous after "
+                      f"normalization (only exact matches are used for these):")
+        print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+        error_log.append(msg_header)
+        for _, row in ambiguous.iterrows():
+            line = f"{row['key']} -> {mapping_dict[row['key']]}"
+            print(line)
+            error_log.append(line)
+
+    unique = df.loc[n_targets == 1].drop_duplicates(subset=['normalized'])
+    normalized = {norm: mapping_dict[key] for norm, key in zip(unique['normalized'], unique['key'])}
+    return LookupIndex(exact=mapping_dict, normalized=normalized, casefold=casefold)
+
+def lookup(series, index):
+    """
+    Maps a series via a LookupIndex: exact match first, then normalized key.
+    Each unique value is looked up (and normalized) only once.
+
+    Returns
+    -------
+    pandas.Series
+        The mapped series (NaN where neither key matches)
+    dict
+        {value: target} for values that only matched after normalization
+    """
+    uniques = pd.Series(series.dropna().unique(), dtype=object)
+    resolved = uniques.map(index.exact).astype(object)
+
+    missing = resolved.isna()
+    fuzzy = normalize_keys(uniques[missing], index.casefold).map(index.normalized).astype(object)
+    resolved = resolved.where(~missing, fuzzy.reindex(resolved.index))
+
+    fuzzy_hits = dict(zip(uniques[missing][fuzzy.notna()], fuzzy.dropna()))
+    return series.map(dict(zip(uniques, resolved))), fuzzy_hits
+
+def unpack_pairs(series):
+    """Splits a series of (first, second) tuples into two series (NaN where the entry is missing)."""
+    codes, pairs = pd.factorize(series)
+    first = np.array([p[0] for p in pairs] + [np.nan], dtype=object)[codes]
+    second = np.array([p[1] for p in pairs] + [np.nan], dtype=object)[codes]
+    return pd.Series(first, index=series.index), pd.Series(second, index=series.index)
+
+def build_filter(patterns):
+    """Compiles a list of names ('*' as wildcard) into one regex. Returns None if no filter is set."""
+    if not patterns:
+        return None
+    return re.compile('|'.join(fnmatch.translate(str(p)) for p in patterns))
+
+def filter_mask(series, index, pattern):
+    """
+    Returns a boolean mask of the rows whose value matches pattern, either by
+    its source name or by its target name in the dictionary.
+    Evaluated once per unique value, before any cleaning or mapping.
+    """
+    uniques = pd.Series(series.dropna().unique(), dtype=object)
+    targets, _ = lookup(uniques, index)
+    keep = [
+        bool(pattern.match(str(value))) or (pd.notna(target) and bool(pattern.match(str(target))))
+        for value, target in zip(uniques, targets)
+    ]
+    return series.isin(uniques[keep])
+
+def partial_targets(mapping_dict, pattern):
+    """
+    Returns the target names of which pattern selects only some of the source
+    names (matched by source name, the target name itself does not match).
+    Data of these targets is incomplete after filtering.
+    """
+    sources_of = {}
+    for source, target in mapping_dict.items():
+        if pd.isna(target):
+            continue
+        sources_of.setdefault(str(target), []).append(str(source))
+    return sorted(
+        target for target, sources in sources_of.items()
+        if not pattern.match(target) and 0 < sum(bool(pattern.match(s)) for s in sources) < len(sources)
+    )
+
 def map_strict(df, column, mapping_dict, label, error_log, drop_unmapped=True):
     """
     Maps a DataFrame column via a provided dictionary and logs missing mappings.
@@ -63,8 +199,9 @@ def map_strict(df, column, mapping_dict, label, error_log, drop_unmapped=True):
         Input DataFrame
     column : str
         Column name in df to be mapped
-    mapping_dict : dict
-        Dictionary for mapping
+    mapping_dict : dict or LookupIndex
+        Dictionary for mapping (compiled with build_lookup_index for
+        case/whitespace-insensitive matching)
     label : str
         Descriptive label for logging (e.g. 'Region', 'Scenario')
     error_log : list
@@ -83,7 +220,18 @@ def map_strict(df, column, mapping_dict, label, error_log, drop_unmapped=True):
         error_log.append(msg)
         return pd.Series(dtype='string')
 
-    mapped = df[column].map(mapping_dict)
+    if isinstance(mapping_dict, LookupIndex):
+        mapped, fuzzy_hits = lookup(df[column], mapping_dict)
+        if fuzzy_hits:
+            msg_header = f"[Dictionary] {len(fuzzy_hits)} {label} entries only matched after normalization (case/whitespace/'|'):"
+            print(Fore.YELLOW + msg_header + Style.RESET_ALL)
+            error_log.append(msg_header)
+            for val, target in fuzzy_hits.items():
+                line = f"{val} -> {target}"
+                print(line)
+                error_log.append(line)
+    else:
+        mapped = df[column].map(mapping_dict)
 
     # find missing
     # missing_items = df.loc[mapped.isna(), column].unique().tolist()
@@ -147,7 +295,607 @@ def load_mapping_dict(file, sheet, src_col, tgt_col, conv_col=None):
     else:
         # alter fallback
         return pd.Series(df[tgt_col].values, index=df[src_col]).to_dict()
-            
+
+AGGREGATION_POLICIES = ('sum', 'mean', 'first', 'error')
+
+def load_aggregation_policy(file, sheet, tgt_col, policy_col, error_log):
+    """
+    Loads the aggregation policy per target variable from the dictionary.
+    Returns an empty dict if the column does not exist.
+    """
+    df = pd.read_excel(file, sheet_name=sheet)
+    if policy_col not in df.columns:
+        msg = f"[Dictionary] No '{policy_col}' column in '{sheet}', using DEFAULT_AGGREGATION for all variables."
+        print(msg)
+        error_log.append(msg)
+        return {}
+
+    df = df.dropna(subset=[tgt_col, policy_col])
+    policies = df[policy_col].astype(str).str.strip().str.lower()
+    invalid = df.loc[~policies.isin(AGGREGATION_POLICIES), tgt_col]
+    if not invalid.empty:
+        msg_header = f"[Dictionary] {len(invalid)} variables with unknown aggregation policy (allowed: {', '.join(AGGREGATION_POLICIES)}), default used:"
+        print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+        error_log.append(msg_header)
+        for val in invalid:
+            print(val)
+            error_log.append(str(val))
+    valid = policies.isin(AGGREGATION_POLICIES)
+    return pd.Series(policies[valid].values, index=df.loc[valid, tgt_col]).to_dict()
+
+def merge_collisions(df, policy, default_policy, model, error_log):
+    """
+    Merges rows that map to the same model/scenario/region/variable/unit/year
+    according to the aggregation policy of the target variable.
+
+    Groups whose values are all identical are collapsed to one row first;
+    each policy is then applied with one grouped reduction over the
+    remaining colliding rows.
+    Rows of variables with policy 'error' are reported and dropped.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Long IAMC data incl. the columns source_variable and source_region
+    policy : dict
+        {target variable: 'sum' | 'mean' | 'first' | 'error'}
+    default_policy : str
+        Policy for variables without an entry
+    model : str
+        Model name (used for logging)
+    error_log : list
+        Global error log list
+
+    Returns
+    -------
+    pandas.DataFrame
+        Data with unique keys (without the source columns)
+    """
+    keys = ['model', 'scenario', 'region', 'variable', 'unit', 'year']
+    source_cols = ['source_variable', 'source_region']
+
+    # collision groups in which all values are identical are kept once, never summed;
+    # groups with differing values keep all rows for the aggregation policy
+    n_rows = len(df)
+    n_values = df.groupby(keys, dropna=False, observed=True, sort=False)['value'].transform('nunique', dropna=False)
+    df = df.loc[~((n_values == 1) & df.duplicated(subset=keys))]
+    if len(df) < n_rows:
+        msg = f"Removed {n_rows - len(df)} rows with identical duplicates for model {model}."
+        print(Fore.GREEN + msg + Style.RESET_ALL)
+        error_log.append(msg)
+
+    dupe_mask = df.duplicated(subset=keys, keep=False)
+    if not dupe_mask.any():
+        msg = f"[Check] No duplicates found for model {model}."
+        print(msg)
+        error_log.append(msg)
+        return df.drop(columns=source_cols)
+
+    unique_rows = df.loc[~dupe_mask]
+    dupes = df.loc[dupe_mask]
+    dupe_policy = dupes['variable'].map(policy).fillna(default_policy)
+
+    msg_header = f"[Check] {int(dupe_mask.sum())} colliding rows found for model {model}, merged per aggregation policy:"
+    print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+    error_log.append(msg_header)
+
+    merged = [unique_rows.drop(columns=source_cols)]
+    for name, group in dupes.groupby(dupe_policy, sort=True):
+        # report which source keys were merged into which target variable
+        sources = group.groupby('variable', observed=True)[source_cols].agg(lambda x: sorted(set(map(str, x))))
+        for variable, row in sources.iterrows():
+            line = f"{variable} ({name}) <- {', '.join(row['source_variable'])}"
+            if len(row['source_region']) > 1:
+                line += f" | regions: {', '.join(row['source_region'])}"
+            print(line)
+            error_log.append(line)
+
+        if name == 'error':
+            msg = f"[Check] {len(group)} colliding rows with aggregation policy 'error' dropped for model {model}."
+            print(Fore.RED + msg + Style.RESET_ALL)
+            error_log.append(msg)
+            continue
+
+        grouped = group.groupby(keys, dropna=False, observed=True, sort=False)['value']
+        # all-NaN groups stay NaN instead of becoming 0
+        reduced = (grouped.sum(min_count=1) if name == 'sum' else grouped.agg(name)).reset_index()
+        merged.append(reduced)
+
+    return pd.concat(merged, ignore_index=True)[keys + ['value']]
+
+PLACEHOLDERS = {'', '-', '--', '–', 'n.a.', 'n.a', 'na', 'n/a', 'nan', 'none', '#n/a', 'k.a.', 'x', '.'}
+
+def detect_number_format(values):
+    """
+    Detects the decimal separator from a sample of number strings.
+    Only unambiguous values vote ('1.234,5', '1,5', '1.234.567' -> comma;
+    '1,234.5', '1.5', '1,234,567' -> point); ties fall back to point.
+
+    Returns
+    -------
+    str
+        ',' (German locale) or '.'
+    """
+    comma = values.str.contains(r'\d\.\d{3},\d', regex=True) \
+        | values.str.fullmatch(r'[-+]?\d*,\d{1,2}|[-+]?\d*,\d{4,}', na=False) \
+        | values.str.fullmatch(r'[-+]?\d{1,3}(\.\d{3}){2,}', na=False)
+    point = values.str.contains(r'\d,\d{3}\.\d', regex=True) \
+        | values.str.fullmatch(r'[-+]?\d*\.\d{1,2}|[-+]?\d*\.\d{4,}', na=False) \
+        | values.str.fullmatch(r'[-+]?\d{1,3}(,\d{3}){2,}', na=False)
+    return ',' if comma.sum() > point.sum() else '.'
+
+def parse_numeric(series, label, error_log, sample_size=1000):
+    """
+    Converts a column to float64, detecting the number format of the file
+    (decimal comma/thousands dots) from a sample. Placeholders such as
+    'n.a.' or '-' become NaN; other unparsable cells are reported with counts.
+    Parsing is done once per unique value; only text cells are rewritten.
+    """
+    if pd.api.types.is_numeric_dtype(series):
+        return pd.Series(series.to_numpy(dtype=float, na_value=np.nan), index=series.index)
+
+    uniques = pd.Series(series.dropna().unique(), dtype=object)
+
+    # cells that are already numbers (e.g. from Excel) are passed through unchanged
+    is_text = uniques.map(lambda v: isinstance(v, str)).astype(bool)
+    numbers = pd.to_numeric(uniques.where(~is_text), errors='coerce').astype(float)
+
+    text = uniques[is_text].str.strip().str.replace(r'[\s\u00a0\']', '', regex=True)
+    is_placeholder = text.str.lower().isin(PLACEHOLDERS).reindex(uniques.index, fill_value=False)
+    decimal = detect_number_format(text[~is_placeholder[is_text]].head(sample_size))
+    if decimal == ',':
+        text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    else:
+        text = text.str.replace(',', '', regex=False)
+    numbers[is_text] = pd.to_numeric(text.where(~is_placeholder[is_text]), errors='coerce').astype(float)
+
+    parsed = series.map(dict(zip(uniques, numbers))).astype(float)
+
+    counts = series.value_counts()
+    n_placeholder = int(counts.reindex(uniques[is_placeholder]).sum())
+    invalid = uniques[numbers.isna() & ~is_placeholder]
+    if decimal == ',':
+        msg = f"[Values] Decimal comma detected for column '{label}'."
+        print(msg)
+        error_log.append(msg)
+    if n_placeholder:
+        msg = f"[Values] {n_placeholder} '{label}' cells with placeholders (e.g. 'n.a.', '-') set to empty."
+        print(msg)
+        error_log.append(msg)
+    if not invalid.empty:
+        msg_header = f"[Values] {int(counts.reindex(invalid).sum())} '{label}' cells could not be parsed as numbers ({len(invalid)} distinct):"
+        print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+        error_log.append(msg_header)
+        for val in invalid.head(20):
+            line = f"{val} - {int(counts[val])} cells"
+            print(line)
+            error_log.append(line)
+
+    return parsed
+
+def normalize_years(series, error_log):
+    """
+    Parses year labels (2020, '2020', 2020.0, '2020.0', '2020-01-01', Period labels, ...)
+    into integer years. Parsing is done once per unique label.
+
+    Parameters
+    ----------
+    series : pandas.Series
+        Raw year column
+    error_log : list
+        Global error log list
+
+    Returns
+    -------
+    pandas.Series
+        Years as nullable integers ('Int64'); unparsable labels become <NA>
+    """
+    labels = pd.Series(series.dropna().unique())
+    years = pd.to_numeric(
+        labels.astype('string').str.extract(r'(?<!\d)(\d{4})(?!\d)', expand=False),
+        errors='coerce'
+    )
+    parsed = series.map(dict(zip(labels, years))).astype('Int64')
+
+    unparsable = labels[years.isna()]
+    if not unparsable.empty:
+        msg_header = f"[Years] {len(unparsable)} year labels could not be parsed, {int(parsed.isna().sum())} rows without a valid year:"
+        print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+        error_log.append(msg_header)
+        for val in unparsable:
+            line = str(val)
+            print(line)
+            error_log.append(line)
+
+    return parsed
+
+def regrid_years(df, grid, method, error_log):
+    """
+    Brings all time series onto a fixed target year grid.
+
+    All series are pivoted into one NumPy array (series x years); linear
+    interpolation (no extrapolation) or aggregation is then done for all
+    series at once.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Long IAMC data with unique model, scenario, region, variable, unit, year
+    grid : list of int
+        Target years
+    method : str
+        'interpolate' (linear between the neighbouring reported years) or
+        'aggregate' (mean of all reported years assigned to the nearest grid year)
+    error_log : list
+        Global error log list
+
+    Returns
+    -------
+    pandas.DataFrame
+        Long IAMC data containing only grid years
+    """
+    keys = ['model', 'scenario', 'region', 'variable', 'unit']
+    grid = np.asarray(sorted(grid), dtype=float)
+
+    wide = df.pivot(index=keys, columns='year', values='value')
+    src_years = wide.columns.to_numpy(dtype=float)
+    values = wide.to_numpy(dtype=float, na_value=np.nan)
+
+    if method == 'interpolate':
+        all_years = np.union1d(src_years, grid)
+        n, m = len(wide), len(all_years)
+        matrix = np.full((n, m), np.nan)
+        matrix[:, np.searchsorted(all_years, src_years)] = values
+
+        # index of the previous / next reported year for every column
+        valid = ~np.isnan(matrix)
+        col_idx = np.arange(m)
+        prev_idx = np.maximum.accumulate(np.where(valid, col_idx, -1), axis=1)
+        next_idx = np.minimum.accumulate(np.where(valid, col_idx, m)[:, ::-1], axis=1)[:, ::-1]
+
+        target_cols = np.searchsorted(all_years, grid)
+        p = prev_idx[:, target_cols]
+        q = next_idx[:, target_cols]
+        inside = (p >= 0) & (q < m)
+        p, q = np.clip(p, 0, m - 1), np.clip(q, 0, m - 1)
+
+        rows = np.arange(n)[:, None]
+        v_prev, v_next = matrix[rows, p], matrix[rows, q]
+        y_prev, y_next = all_years[p], all_years[q]
+        span = y_next - y_prev
+        weight = np.divide(grid - y_prev, span, out=np.zeros_like(span), where=span != 0)
+        result = np.where(inside, v_prev + (v_next - v_prev) * weight, np.nan)
+
+    elif method == 'aggregate':
+        in_range = (src_years >= grid[0]) & (src_years <= grid[-1])
+        if (~in_range).any():
+            msg = f"[Years] {int((~in_range).sum())} reported years outside the grid {int(grid[0])}-{int(grid[-1])} dropped."
+            print(Fore.YELLOW + msg + Style.RESET_ALL)
+            error_log.append(msg)
+        src_years, values = src_years[in_range], values[:, in_range]
+
+        # nearest grid year for every reported year (ties go to the earlier one)
+        if len(grid) > 1:
+            pos = np.clip(np.searchsorted(grid, src_years), 1, len(grid) - 1)
+            pos = np.where(src_years - grid[pos - 1] <= grid[pos] - src_years, pos - 1, pos)
+        else:
+            pos = np.zeros(len(src_years), dtype=int)
+
+        # mean per grid year: sum and count of reported values via one matrix product
+        membership = np.zeros((len(src_years), len(grid)))
+        membership[np.arange(len(src_years)), pos] = 1
+        reported = ~np.isnan(values)
+        sums = np.where(reported, values, 0) @ membership
+        counts = reported.astype(float) @ membership
+        result = np.divide(sums, counts, out=np.full_like(sums, np.nan), where=counts > 0)
+
+    else:
+        raise ValueError(f"Unknown YEAR_GRID_METHOD '{method}' (use 'interpolate' or 'aggregate').")
+
+    df_grid = pd.DataFrame(result, index=wide.index, columns=grid.astype(int))
+    df_grid.columns.name = 'year'
+    df_grid = (
+        df_grid.reset_index()
+        .melt(id_vars=keys, var_name='year', value_name='value')
+        .dropna(subset=['value'])
+    )
+    df_grid['year'] = df_grid['year'].astype('Int64')
+
+    msg = (f"[Years] {len(wide)} series brought onto {len(grid)} grid years via '{method}' "
+           f"({len(src_years)} reported years, {len(df_grid)} values).")
+    print(msg)
+    error_log.append(msg)
+
+    return df_grid
+
+def load_region_hierarchy(file, sheet, error_log):
+    """
+    Loads aggregate regions and their members from the dictionary.
+    Nested aggregates (e.g. 'Europe' containing 'EU27') are resolved to
+    their base regions.
+
+    Returns
+    -------
+    dict
+        {aggregate_region: sorted list of base member regions}
+    """
+    try:
+        df = pd.read_excel(file, sheet_name=sheet)
+    except ValueError:
+        msg = f"[Regions] Sheet '{sheet}' not found in dictionary, region aggregation disabled."
+        print(Fore.YELLOW + msg + Style.RESET_ALL)
+        error_log.append(msg)
+        return {}
+
+    df = df.dropna(subset=['aggregate_region', 'member_region'])
+    direct = df.groupby('aggregate_region')['member_region'].apply(set).to_dict()
+
+    def resolve(region, path):
+        if region in path:
+            raise ValueError(f"Circular region hierarchy: {' -> '.join(path + [region])}")
+        if region not in direct:
+            return {region}
+        return set().union(*(resolve(member, path + [region]) for member in direct[region]))
+
+    return {aggregate: sorted(resolve(aggregate, [])) for aggregate in direct}
+
+def aggregate_regions(df, hierarchy, model, error_log, min_coverage=1.0, tolerance=1e-3, exclude=()):
+    """
+    Computes all aggregate regions from their member regions.
+
+    The data is pivoted once into a matrix (series x regions) and multiplied
+    with a sparse region -> aggregate membership matrix, so all aggregates
+    for all variables, scenarios and years are computed in one step.
+    Aggregates already reported by the model are kept and cross-checked
+    against the computed values.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Long IAMC data with unique model, scenario, region, variable, unit, year
+    hierarchy : dict
+        {aggregate_region: list of member regions}, see load_region_hierarchy
+    model : str
+        Model name (used for logging)
+    error_log : list
+        Global error log list
+    min_coverage : float, optional
+        Share of members that must be reported for an aggregate value (default 1.0)
+    tolerance : float, optional
+        Relative tolerance for native vs. computed aggregates (default 1e-3)
+    exclude : list of str, optional
+        Variable prefixes that are not additive (e.g. prices) and are skipped
+
+    Returns
+    -------
+    pandas.DataFrame
+        Input data plus the computed aggregate rows
+    """
+    keys = ['model', 'scenario', 'variable', 'unit', 'year']
+
+    additive = pd.Series(True, index=df.index)
+    if exclude:
+        additive = ~df['variable'].astype('string').str.startswith(tuple(exclude)).fillna(False)
+    wide = df.loc[additive].pivot(index=keys, columns='region', values='value')
+    regions = wide.columns
+    aggregates = [agg for agg, members in hierarchy.items() if regions.isin(members).any()]
+    if not aggregates:
+        msg = f"[Regions] No member regions of any aggregate found for model {model}."
+        print(msg)
+        error_log.append(msg)
+        return df
+
+    # sparse membership matrix (regions x aggregates), built once
+    rows, cols = [], []
+    for j, agg in enumerate(aggregates):
+        member_idx = np.flatnonzero(regions.isin(hierarchy[agg]))
+        rows.extend(member_idx)
+        cols.extend([j] * len(member_idx))
+    membership = sparse.csr_matrix((np.ones(len(rows)), (rows, cols)), shape=(len(regions), len(aggregates)))
+    n_members = np.array([len(hierarchy[agg]) for agg in aggregates], dtype=float)
+
+    values = wide.to_numpy(dtype=float, na_value=np.nan)
+    reported = ~np.isnan(values)
+    sums = (membership.T @ np.where(reported, values, 0).T).T
+    coverage = (membership.T @ reported.astype(float).T).T / n_members
+    computed = np.where(coverage >= min_coverage - 1e-9, sums, np.nan)
+
+    df_agg = pd.DataFrame(computed, index=wide.index, columns=pd.Index(aggregates, name='region'))
+    df_agg = (
+        df_agg.reset_index()
+        .melt(id_vars=keys, var_name='region', value_name='value')
+        .dropna(subset=['value'])
+    )
+
+    # cross-check aggregates reported natively by the model
+    native = df.loc[df['region'].isin(aggregates), keys + ['region', 'value']]
+    checked = native.merge(df_agg, on=keys + ['region'], how='inner', suffixes=('_native', '_computed'))
+    deviation = (checked['value_native'] - checked['value_computed']).abs()
+    scale = np.maximum(checked['value_native'].abs(), checked['value_computed'].abs())
+    mismatches = checked.loc[deviation > tolerance * scale]
+    if not mismatches.empty:
+        msg_header = (f"[Regions] {len(mismatches)} of {len(checked)} native aggregate values differ from the sum "
+                      f"of their members for model {model} (native values kept):")
+        print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+        error_log.append(msg_header)
+        for (region, variable), count in mismatches.groupby(['region', 'variable']).size().items():
+            line = f"{region} - {variable} - {count} mismatches"
+            print(line)
+            error_log.append(line)
+
+    # only add aggregates the model does not report itself
+    df_agg = df_agg.merge(native[keys + ['region']], on=keys + ['region'], how='left', indicator=True)
+    df_agg = df_agg.loc[df_agg['_merge'] == 'left_only'].drop(columns='_merge')
+
+    incomplete = int(((coverage > 0) & (coverage < min_coverage - 1e-9)).sum())
+    msg = (f"[Regions] {len(df_agg)} aggregate values added for {len(aggregates)} aggregate regions "
+           f"for model {model} ({incomplete} skipped due to incomplete member coverage).")
+    print(msg)
+    error_log.append(msg)
+
+    return pd.concat([df, df_agg[df.columns]], ignore_index=True)
+
+def plan_shards(df, max_rows):
+    """
+    Splits the output into shards of at most max_rows rows.
+    Whole scenarios are kept together where possible; scenarios that are
+    larger than max_rows on their own are split into row blocks.
+
+    Returns
+    -------
+    list of numpy.ndarray
+        Row positions of each shard
+    """
+    positions = df.groupby('scenario', sort=False).indices
+    shards, current, current_rows = [], [], 0
+    for scenario, rows in positions.items():
+        if len(rows) > max_rows:
+            if current:
+                shards.append(np.concatenate(current))
+                current, current_rows = [], 0
+            shards.extend(rows[i:i + max_rows] for i in range(0, len(rows), max_rows))
+            continue
+        if current_rows + len(rows) > max_rows:
+            shards.append(np.concatenate(current))
+            current, current_rows = [], 0
+        current.append(rows)
+        current_rows += len(rows)
+    if current:
+        shards.append(np.concatenate(current))
+    return shards
+
+def write_output(df_output, model, error_log, max_rows=1048575):
+    """
+    Writes the pyam output of one model to OUTPUT_FOLDER.
+
+    Outputs above the Excel row limit are split by scenario (or row blocks)
+    into numbered files pyam_{model}_partNN.xlsx, written one after another
+    (openpyxl is pure Python, threads would not speed this up). The
+    layout is recorded in pyam_{model}_shards.csv.
+    """
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+    single_file = os.path.join(OUTPUT_FOLDER, f"pyam_{model}.xlsx")
+    index_file = os.path.join(OUTPUT_FOLDER, f"pyam_{model}_shards.csv")
+
+    # remove results of a previous run with a different layout
+    stale = list(Path(OUTPUT_FOLDER).glob(f"pyam_{model}_part*.xlsx")) + [Path(index_file), Path(single_file)]
+    for old_file in stale:
+        if old_file.is_file():
+            old_file.unlink()
+
+    if len(df_output) <= max_rows:
+        df_output.to_excel(single_file, index=False, sheet_name='pyam_data')
+        return [single_file]
+
+    shards = plan_shards(df_output, max_rows)
+    files = [os.path.join(OUTPUT_FOLDER, f"pyam_{model}_part{i:02d}.xlsx") for i in range(1, len(shards) + 1)]
+
+    for shard_file, rows in zip(files, shards):
+        df_output.iloc[rows].to_excel(shard_file, index=False, sheet_name='pyam_data')
+
+    pd.DataFrame({
+        'file': [os.path.basename(f) for f in files],
+        'sheet': 'pyam_data',
+        'rows': [len(rows) for rows in shards],
+        'scenarios': ['; '.join(map(str, df_output['scenario'].iloc[rows].unique())) for rows in shards],
+    }).to_csv(index_file, index=False)
+
+    msg = (f"[Output] {len(df_output)} rows exceed the Excel limit of {max_rows} rows, "
+           f"split into {len(files)} files for model {model} (see {os.path.basename(index_file)}).")
+    print(Fore.YELLOW + msg + Style.RESET_ALL)
+    error_log.append(msg)
+    return files
+
+def check_hierarchy(df, model, error_log, tolerance=1e-3, exclude=()):
+    """
+    Checks that every parent variable equals the sum of its direct children
+    (IAMC hierarchy 'A|B' = sum of 'A|B|*') reported in the same unit.
+
+    The parent of each unique variable name is derived once; all child sums
+    are then computed with a single grouped aggregation over all levels.
+
+    Parameters
+    ----------
+    df : pandas.DataFrame
+        Long IAMC data with columns model, scenario, region, variable, year, value
+    model : str
+        Model name (used for logging and the detail file)
+    error_log : list
+        Global error log list
+    tolerance : float, optional
+        Relative tolerance for reporting a mismatch (default 1e-3)
+    exclude : list of str, optional
+        Variable prefixes that are not additive (e.g. prices) and are not checked
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per parent/year with parent value, child sum and deviation
+        (empty if no mismatches)
+    """
+    # children are only summed (and compared) within the same unit
+    keys = ['model', 'scenario', 'region', 'unit', 'year']
+
+    # parent/child index from unique variable names (without non-additive trees)
+    variables = pd.Series(df['variable'].dropna().unique(), dtype=object)
+    if exclude:
+        variables = variables[~variables.astype(str).str.startswith(tuple(exclude))].reset_index(drop=True)
+    parents = variables.str.rsplit('|', n=1).str[0].where(variables.str.contains('|', regex=False))
+    parent_of = dict(zip(variables, parents))
+    existing = set(variables)
+    parent_of = {child: parent for child, parent in parent_of.items()
+                 if isinstance(parent, str) and parent in existing}
+
+    if not parent_of:
+        msg = f"[Hierarchy] No parent/child variables found for model {model}."
+        print(msg)
+        error_log.append(msg)
+        return pd.DataFrame()
+
+    values = pd.to_numeric(df['value'], errors='coerce')
+    child_parent = df['variable'].map(parent_of)
+    is_child = child_parent.notna()
+
+    # one grouped aggregation for all levels
+    child_sums = (
+        df.loc[is_child, keys]
+        .assign(variable=child_parent[is_child].values, child_sum=values[is_child].values)
+        .groupby(keys + ['variable'], dropna=False, observed=True)['child_sum']
+        .sum(min_count=1)
+        .reset_index()
+    )
+
+    parent_rows = df.loc[df['variable'].isin(set(parent_of.values())), keys + ['variable']].copy()
+    parent_rows['parent_value'] = values.loc[parent_rows.index]
+
+    checked = parent_rows.merge(child_sums, on=keys + ['variable'], how='inner')
+    checked['deviation'] = checked['parent_value'] - checked['child_sum']
+    scale = np.maximum(checked['parent_value'].abs(), checked['child_sum'].abs())
+    mismatch = checked['deviation'].abs() > tolerance * scale
+    mismatches = checked.loc[mismatch].sort_values(keys + ['variable']).reset_index(drop=True)
+
+    if mismatches.empty:
+        msg = f"[Hierarchy] {len(checked)} parent values checked, no mismatches for model {model}."
+        print(msg)
+        error_log.append(msg)
+        return mismatches
+
+    msg_header = (f"[Hierarchy] {len(mismatches)} of {len(checked)} parent values differ from the sum "
+                  f"of their children (rel. tolerance {tolerance}) for model {model}:")
+    print(Fore.YELLOW + Style.BRIGHT + msg_header + Style.RESET_ALL)
+    error_log.append(msg_header)
+    for variable, count in mismatches['variable'].value_counts().sort_index().items():
+        line = f"{variable} - {count} mismatches"
+        print(line)
+        error_log.append(line)
+
+    out_file = os.path.join(OUTPUT_FOLDER, f"hierarchy_check_{model}.csv")
+    os.makedirs(os.path.dirname(out_file), exist_ok=True)
+    mismatches.to_csv(out_file, index=False)
+    print(f"Details saved to: {out_file}")
+
+    return mismatches
+
 # ============================================================
 # 1. Dictionary-Dateien laden
 # ============================================================
@@ -159,8 +907,6 @@ dict_region   = load_mapping_dict(DICTIONARY_FILE_PATH, 'regions', 'source_regio
 dict_model    = load_mapping_dict(DICTIONARY_FILE_PATH, 'models', 'source_models', 'target_models')
 dict_scenario = load_mapping_dict(DICTIONARY_FILE_PATH, 'scenarios', 'source_scenario', 'target_scenario')
 dict_unit     = load_mapping_dict(DICTIONARY_FILE_PATH, 'units', 'source_unit', 'target_unit', 'conversion_factor')
-dict_unit_target = {k: v['target'] for k, v in dict_unit.items()}
-dict_unit_factor = {k: v['factor'] for k, v in dict_unit.items()}
 
 
 print(f"{len(dict_variable)} variables loaded from dictionary.")
@@ -175,6 +921,35 @@ print(f"{len(dict_unit)} units loaded from dictionary.\n")
 
 error_log = []
 
+# two-level lookup indices (exact + normalized keys)
+index_variable    = build_lookup_index(dict_variable, 'Variables', error_log)
+index_region      = build_lookup_index(dict_region, 'Regions', error_log)
+index_scenario    = build_lookup_index(dict_scenario, 'Scenarios', error_log)
+# units: one index for target unit and factor together, case-sensitive ('mt' != 'Mt')
+index_unit        = build_lookup_index({k: (v['target'], v['factor']) for k, v in dict_unit.items()},
+                                       'Units', error_log, casefold=False)
+
+# compiled filters (None = no filter)
+model_filter    = build_filter(filter_models)
+scenario_filter = build_filter(filter_scenarios)
+region_filter   = build_filter(filter_regions)
+variable_filter = build_filter(filter_variables)
+# target scenarios of which the scenario filter keeps only some source scenarios
+partial_scenarios = partial_targets(dict_scenario, scenario_filter) if scenario_filter is not None else []
+active_filters = {name: values for name, values in [
+    ('models', filter_models), ('scenarios', filter_scenarios), ('regions', filter_regions),
+    ('years', filter_years), ('variables', filter_variables)] if values}
+if active_filters:
+    msg = "[Filter] Only converting " + "; ".join(f"{name}: {', '.join(map(str, values))}" for name, values in active_filters.items())
+    print(Fore.CYAN + msg + Style.RESET_ALL)
+    error_log.append(msg)
+
+region_hierarchy = load_region_hierarchy(DICTIONARY_FILE_PATH, REGION_HIERARCHY_SHEET, error_log) if AGGREGATE_REGIONS else {}
+print(f"{len(region_hierarchy)} aggregate regions loaded from dictionary.\n")
+
+aggregation_policy = load_aggregation_policy(DICTIONARY_FILE_PATH, 'variables', 'DE variable name', 'aggregation', error_log)
+print(f"{len(aggregation_policy)} variable aggregation policies loaded from dictionary.\n")
+
 # ============================================================
 # 3. Mapping-Datei laden
 # ============================================================
@@ -218,6 +993,8 @@ model_groups = df_mapping_full.groupby('Source model')
 print(f"\n{len(model_groups)} unique models for processing found.")
 
 for model, model_group in model_groups:
+    if model_filter is not None and not (model_filter.match(str(model)) or model_filter.match(str(dict_model.get(model, model)))):
+        continue
     print(Fore.CYAN + Style.BRIGHT + f"\n=== Processing model: {model} ===" + Style.RESET_ALL)
     error_log.append(f"\n=== {model} ===")
 
@@ -236,20 +1013,23 @@ for model, model_group in model_groups:
         error_log.append(f"\n--- {file_name} ---")
 
         # ----------------------------------------------------
-        # Read source file (.xlsx or .csv)
+        # Read source file (.xlsx or .csv, also .gz/.zst or inside a .zip archive)
         # ----------------------------------------------------
         sheet_name = config.get('Sheet name', 0) or 0
+        data_name = strip_compression(file_name).lower()
         try:
-            if file_name.lower().endswith('.xlsx'):
-                df_input = pd.read_excel(
-                    INPUT_FILE_PATH,
-                    sheet_name=sheet_name,
-                    usecols=lambda col: col not in ["Unnamed: 0"],
-                    engine="openpyxl"
-                )
-            elif file_name.lower().endswith('.csv'):
+            if data_name.endswith('.xlsx'):
+                with open_input(INPUT_FILE_PATH, seekable=True) as f:
+                    df_input = pd.read_excel(
+                        f,
+                        sheet_name=sheet_name,
+                        usecols=lambda col: col not in ["Unnamed: 0"],
+                        engine="openpyxl"
+                    )
+            elif data_name.endswith('.csv'):
                 sep = config['Separator'] if config['Separator'] else ','
-                df_input = pd.read_csv(INPUT_FILE_PATH, sep=sep, low_memory=False, engine="c", dtype_backend="numpy_nullable")
+                with open_input(INPUT_FILE_PATH) as f:
+                    df_input = pd.read_csv(f, sep=sep, low_memory=False, engine="c", dtype_backend="numpy_nullable")
                 df_input.dropna(how='all', inplace=True)
 
             else:
@@ -275,6 +1055,29 @@ for model, model_group in model_groups:
         found_cols = [c for c in ["scenario", "region", "year", "value", "unit"] if c in df_input.columns]
         print(f"Standardized columns: {found_cols}")
 
+        # normalize year labels (2020.0, '2020', Period labels, ...) to integers
+        if 'year' in df_input.columns:
+            df_input['year'] = normalize_years(df_input['year'], error_log)
+
+        # ----------------------------------------------------
+        # Filter pushdown: drop unselected rows before any cleaning/mapping
+        # ----------------------------------------------------
+        if active_filters:
+            n_rows = len(df_input)
+            keep = pd.Series(True, index=df_input.index)
+            if scenario_filter is not None and 'scenario' in df_input.columns:
+                keep &= filter_mask(df_input['scenario'], index_scenario, scenario_filter)
+            if region_filter is not None and 'region' in df_input.columns:
+                keep &= filter_mask(df_input['region'], index_region, region_filter)
+            if filter_years and 'year' in df_input.columns:
+                keep &= df_input['year'].isin(filter_years).fillna(False)
+            df_input = df_input.loc[keep].copy()
+            print(f"[Filter] {len(df_input)} of {n_rows} rows selected.")
+
+        # parse values (decimal comma, thousands separators, 'n.a.', ...) into float64
+        if 'value' in df_input.columns:
+            df_input['value'] = parse_numeric(df_input['value'], 'value', error_log)
+
         # ----------------------------------------------------
         # Variable column preparation
         # ----------------------------------------------------
@@ -292,10 +1095,15 @@ for model, model_group in model_groups:
                 cleaned = df_input[columns_to_combine].astype('string').fillna('').apply(lambda x: '|'.join(x), axis=1)
                 df_input['original_variable'] = cleaned.str.strip()
                 del cleaned; gc.collect()
+                # combined variable names only exist after joining the columns
+                if variable_filter is not None:
+                    df_input = df_input.loc[filter_mask(df_input['original_variable'], index_variable, variable_filter)].copy()
             else:
                 col = mapping_source_columns
                 if col not in df_input.columns:
                     raise KeyError(f"Column '{col}' not found.")
+                if variable_filter is not None:
+                    df_input = df_input.loc[filter_mask(df_input[col], index_variable, variable_filter)].copy()
                 df_input['original_variable'] = df_input[col].astype('string').fillna('').str.strip()
         except KeyError as e:
             msg = f"ERROR: {e}. Skipping file {file_name}"
@@ -306,22 +1114,27 @@ for model, model_group in model_groups:
         # ----------------------------------------------------
         # Dictionary mapping
         # ----------------------------------------------------
-        df_input['variable'] = map_strict(df_input, 'original_variable', dict_variable, 'Variables', error_log)
-        df_input['region']   = map_strict(df_input, 'region', dict_region, 'Regions', error_log)
-        df_input['scenario'] = map_strict(df_input, 'scenario', dict_scenario, 'Scenarios', error_log)
+        df_input['variable'] = map_strict(df_input, 'original_variable', index_variable, 'Variables', error_log)
+        df_input['source_region'] = df_input['region'] if 'region' in df_input.columns else pd.NA
+        df_input['region']   = map_strict(df_input, 'region', index_region, 'Regions', error_log)
+        df_input['scenario'] = map_strict(df_input, 'scenario', index_scenario, 'Scenarios', error_log)
         
         # --- Convert units into desired target unit/dimension
+        # target unit and conversion factor come from the same dictionary entry
+        unit_info = map_strict(df_input, 'unit', index_unit, 'Units', error_log).reindex(df_input.index)
+        target_unit, conversion_factor = unpack_pairs(unit_info)
+
         # get conversion factor from dictionary (default to 1 if not found)
-        df_input['conversion_factor'] = df_input['unit'].map(dict_unit_factor).fillna(1)
+        df_input['conversion_factor'] = conversion_factor.astype(float).fillna(1)
 
         # recalculate values based on conversion factor (if unit was found in dict, otherwise keep original value)
         df_input['value'] = df_input['value'] * df_input['conversion_factor']
 
-        # rename unit to target unit (if found in dict, otherwise keep original unit)
-        df_input['unit'] = map_strict(df_input, 'unit', dict_unit_target, 'Units', error_log)
+        # rename unit to target unit (NaN if not found in dict)
+        df_input['unit'] = target_unit
 
 
-        df_input.dropna(subset=['variable', 'region', 'scenario'], inplace=True)
+        df_input.dropna(subset=['variable', 'region', 'scenario', 'year'], inplace=True)
         if df_input.empty:
             msg = f"INFO: No valid data for {file_name}. Skipped."
             print(Fore.RED + msg + Style.RESET_ALL)
@@ -338,7 +1151,9 @@ for model, model_group in model_groups:
             'unit':     df_input['unit'],
             'year':     df_input['year'],
             'value':    df_input['value'],
-            'variable': df_input['variable']
+            'variable': df_input['variable'],
+            'source_variable': df_input['original_variable'],
+            'source_region': df_input['source_region']
         }
         df_iamc = pd.DataFrame(data_for_iamc)
 
@@ -361,69 +1176,75 @@ for model, model_group in model_groups:
     df_model_combined = pd.concat(df_model_all, ignore_index=True, copy=False)
 
     # --------------------------------------------------------
-    # Detect duplicates and mark them clearly
+    # Merge colliding rows per aggregation policy
     # --------------------------------------------------------
-    dup_cols = ['model', 'scenario', 'region', 'variable', 'unit', 'year']
-    dupe_mask = df_model_combined.duplicated(subset=dup_cols, keep=False)
-
-    if dupe_mask.any():
-        dup_count = dupe_mask.sum()
-        msg = f"[Check] Found {dup_count} duplicate rows for model {model}. Identical-valued duplicates will be removed; differing ones will be suffixed."
-        print(Fore.YELLOW + msg + Style.RESET_ALL)
-        error_log.append(msg)
+    df_model_combined = merge_collisions(df_model_combined, aggregation_policy, DEFAULT_AGGREGATION, model, error_log)
 
-        # identify duplicates grouped by keys
-        grouped_dupes = df_model_combined[dupe_mask].groupby(dup_cols, dropna=False)
-
-        rows_to_drop = set()
-        rows_to_rename = []
+    # --------------------------------------------------------
+    # 5.2. Bring all series onto the configured year grid
+    # --------------------------------------------------------
+    if YEAR_GRID:
+        df_model_combined = regrid_years(df_model_combined, YEAR_GRID, YEAR_GRID_METHOD, error_log)
 
-        for key, group in grouped_dupes:
-            # If all 'value' entries in group are identical, mark all but first for deletion
-            if group['value'].nunique() == 1:
-                rows_to_drop.update(group.index[1:])
-            else:
-                # assign incremental IDs for visible duplicates
-                for i, idx in enumerate(group.index, start=1):
-                    rows_to_rename.append((idx, f"dup_{group.iloc[i-1]['region']}_{i}"))
-
-        # delete exact duplicates
-        if rows_to_drop:
-            df_model_combined.drop(index=list(rows_to_drop), inplace=True)
-            msg = f"Removed {len(rows_to_drop)} rows with identical duplicates for model {model}."
-            print(Fore.GREEN + msg + Style.RESET_ALL)
-            error_log.append(msg)
+    # --------------------------------------------------------
+    # 5.2b Compute aggregate regions from member regions
+    # --------------------------------------------------------
+    if region_hierarchy:
+        df_model_combined = aggregate_regions(
+            df_model_combined, region_hierarchy, model, error_log,
+            min_coverage=REGION_MIN_COVERAGE, tolerance=HIERARCHY_TOLERANCE,
+            exclude=REGION_AGGREGATION_EXCLUDE
+        )
 
-        # rename only the true differing duplicates
-        if rows_to_rename:
-            for idx, new_name in rows_to_rename:
-                df_model_combined.at[idx, 'region'] = new_name
+    # --------------------------------------------------------
+    # 5.3. Check hierarchy consistency (parent = sum of children)
+    # --------------------------------------------------------
+    if CHECK_HIERARCHY:
+        check_hierarchy(df_model_combined, model, error_log, tolerance=HIERARCHY_TOLERANCE,
+                        exclude=HIERARCHY_EXCLUDE)
 
-            msg = f"Renamed {len(rows_to_rename)} remaining duplicate rows with 'dup_' prefix for model {model}."
-            print(Fore.GREEN + msg + Style.RESET_ALL)
+    # --------------------------------------------------------
+    # 5.3b Write long format into the shared partitioned store
+    # --------------------------------------------------------
+    if WRITE_STORE:
+        if filter_regions or filter_years or filter_variables or partial_scenarios:
+            # partitions are replaced as a whole, a partial scenario would overwrite complete data
+            # (also if --scenario selects only some of the source scenarios of one target scenario)
+            msg = f"[Store] Region/year/variable filter or partial scenario filter active, shared store not updated for model {model}."
+            if partial_scenarios:
+                msg += f" Incomplete target scenarios: {', '.join(partial_scenarios)}"
+            print(Fore.YELLOW + msg + Style.RESET_ALL)
             error_log.append(msg)
-    else:
-        msg = f"[Check] No duplicates found for model {model}."
-        print(msg)
-        error_log.append(msg)
+        else:
+            try:
+                store = os.path.join(OUTPUT_FOLDER, 'pyam_store')
+                n_partitions = write_partitions(df_model_combined, store)
+                msg = f"[Store] {n_partitions} model/scenario partitions written to {store}."
+                print(msg)
+                error_log.append(msg)
+            except Exception as e:
+                msg = f"ERROR writing shared store for model {model}: {e}"
+                print(Fore.RED + msg + Style.RESET_ALL)
+                error_log.append(msg)
 
     # --------------------------------------------------------
-    # 5.4. Pivotieren & Speichern (safe even with renamed duplicates)
+    # 5.4. Pivotieren & Speichern
     # --------------------------------------------------------
     try:
         df_output = (
             df_model_combined
             .pivot(index=['model', 'scenario', 'region', 'variable', 'unit'],
                 columns='year', values='value')
-            .reset_index()
         )
+        if YEAR_GRID:
+            # fixed, dense set of year columns for every model
+            df_output = df_output.reindex(columns=sorted(YEAR_GRID))
+        df_output = df_output.reset_index()
         df_output.columns = [str(col) for col in df_output.columns]
 
-        out_file = os.path.join(OUTPUT_FOLDER, f"pyam_{model}.xlsx")
-        os.makedirs(os.path.dirname(out_file), exist_ok=True)
-        df_output.to_excel(out_file, index=False, sheet_name='pyam_data')
+        write_output(df_output, model, error_log, max_rows=EXCEL_MAX_ROWS)
 
-        print(Fore.GREEN + f"✅ Saved combined (with dup markers) file for model: {model}" + Style.RESET_ALL)
+        print(Fore.GREEN + f"✅ Saved combined file for model: {model}" + Style.RESET_ALL)
 
     except Exception as e:
         msg = f"ERROR during pivot/save for model {model}: {e}"
@@ -0,0 +1,152 @@
+import argparse
+import os
+import time
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from colorama import Fore, Style, init
+init(autoreset=True)
+
+from config import OUTPUT_FOLDER, DIFF_TOLERANCE
+from store_utils import read_store
+
+# Compares two converted pyam outputs (e.g. before/after a dictionary update):
+#   python konverter/4_compare_outputs.py old/pyam_MODEL.xlsx output/pyam_MODEL.xlsx
+# Copies of the shared store (output/pyam_store) can be compared as well, reading only the selected models:
+#   python konverter/4_compare_outputs.py old/pyam_store output/pyam_store --model "Model A"
+
+KEYS = ['model', 'scenario', 'region', 'variable', 'unit']
+
+
+def load_long(filepath, models=None):
+    """
+    Reads a pyam output file (wide, one column per year), a sharded output
+    (via pyam_MODEL_shards.csv) or a shared store folder and returns it in long form with the columns model, scenario,
+    region, variable, unit, year, value.
+    """
+    filepath = Path(filepath)
+    if filepath.is_dir():
+        df_long = read_store(filepath, models=models)
+        df_long['year'] = df_long['year'].astype('Int64')
+        return df_long[KEYS + ['year', 'value']].dropna(subset=['year', 'value'])
+
+    # sharded output (pyam_MODEL_partNN.xlsx): read all parts listed in pyam_MODEL_shards.csv
+    shard_index = filepath.with_name(f"{filepath.stem}_shards.csv")
+    if filepath.name.endswith('_shards.csv'):
+        shard_index = filepath
+    if shard_index.is_file() and (shard_index == filepath or not filepath.is_file()):
+        shards = pd.read_csv(shard_index)
+        df = pd.concat([
+            pd.read_excel(shard_index.parent / row['file'], sheet_name=row['sheet'], engine='calamine')
+            for _, row in shards.iterrows()
+        ], ignore_index=True)
+    elif filepath.suffix.lower() == '.csv':
+        df = pd.read_csv(filepath)
+    else:
+        df = pd.read_excel(filepath, sheet_name=0, engine='calamine')
+    df.columns = [str(col).strip() for col in df.columns]
+
+    missing = [c for c in KEYS if c not in df.columns]
+    if missing:
+        raise KeyError(f"Columns {missing} not found in {filepath}.")
+
+    year_cols = [c for c in df.columns if c not in KEYS]
+    df_long = df.melt(id_vars=KEYS, value_vars=year_cols, var_name='year', value_name='value')
+    df_long['year'] = pd.to_numeric(df_long['year'], errors='coerce').astype('Int64')
+    df_long['value'] = pd.to_numeric(df_long['value'], errors='coerce')
+    return df_long.dropna(subset=['year', 'value'])
+
+
+def compare(df_old, df_new, tolerance):
+    """
+    Aligns two long outputs with a hash join on model, scenario, region,
+    variable, unit and year.
+
+    Returns
+    -------
+    pandas.DataFrame
+        One row per added, removed or changed value with a 'status' column
+        ('added', 'removed', 'changed') and the old/new values
+    dict
+        Summary counts
+    """
+    keys = KEYS + ['year']
+    merged = df_old.merge(df_new, on=keys, how='outer', suffixes=('_old', '_new'), indicator=True)
+
+    old_values = merged['value_old'].to_numpy(dtype=float)
+    new_values = merged['value_new'].to_numpy(dtype=float)
+    abs_diff = np.abs(new_values - old_values)
+    scale = np.maximum(np.abs(old_values), np.abs(new_values))
+    both = (merged['_merge'] == 'both').to_numpy()
+    rel_diff = np.divide(abs_diff, scale, out=np.where(both, 0.0, np.nan), where=both & (scale > 0))
+    changed = both & (abs_diff > tolerance * scale)
+
+    status = np.select(
+        [(merged['_merge'] == 'right_only').to_numpy(), (merged['_merge'] == 'left_only').to_numpy(), changed],
+        ['added', 'removed', 'changed'],
+        default=''
+    )
+    merged['abs_diff'] = abs_diff
+    merged['rel_diff'] = rel_diff
+    merged['status'] = status
+
+    details = merged.loc[status != '', keys + ['value_old', 'value_new', 'abs_diff', 'rel_diff', 'status']]
+
+    # series (without year) that exist only on one side
+    series_old = df_old[KEYS].drop_duplicates()
+    series_new = df_new[KEYS].drop_duplicates()
+    series = series_old.merge(series_new, on=KEYS, how='outer', indicator=True)
+
+    summary = {
+        'series old': len(series_old),
+        'series new': len(series_new),
+        'series added': int((series['_merge'] == 'right_only').sum()),
+        'series removed': int((series['_merge'] == 'left_only').sum()),
+        'values compared': int(both.sum()),
+        'values added': int((status == 'added').sum()),
+        'values removed': int((status == 'removed').sum()),
+        'values changed': int(changed.sum()),
+    }
+    return details.reset_index(drop=True), summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two converted pyam output files.')
+    parser.add_argument('old_file', help='previous pyam output (.xlsx, .csv, _shards.csv or store folder)')
+    parser.add_argument('new_file', help='new pyam output (.xlsx, .csv, _shards.csv or store folder)')
+    parser.add_argument('--model', nargs='+', help='only these models (store folders only)')
+    parser.add_argument('--tolerance', type=float, default=DIFF_TOLERANCE,
+                        help=f'relative tolerance for changed values (default {DIFF_TOLERANCE})')
+    args = parser.parse_args()
+
+    start_time = time.time()
+
+    print(f"Reading old file: {args.old_file}")
+    df_old = load_long(args.old_file, args.model)
+    print(f"Reading new file: {args.new_file}")
+    df_new = load_long(args.new_file, args.model)
+
+    details, summary = compare(df_old, df_new, args.tolerance)
+
+    print(Fore.CYAN + Style.BRIGHT + f"\n=== Diff (rel. tolerance {args.tolerance}) ===" + Style.RESET_ALL)
+    for label, count in summary.items():
+        print(f"{label:<16} {count:>10}")
+
+    if details.empty:
+        print(Fore.GREEN + "\n✅ No differences found." + Style.RESET_ALL)
+    else:
+        top = details.groupby(['variable', 'status']).size().unstack(fill_value=0)
+        top = top.loc[top.sum(axis=1).sort_values(ascending=False).index[:10]]
+        print(Fore.YELLOW + "\nVariables with most differences:" + Style.RESET_ALL)
+        print(top.to_string())
+
+        out_file = os.path.join(OUTPUT_FOLDER, f"diff_{Path(args.new_file).stem}.csv")
+        os.makedirs(os.path.dirname(out_file), exist_ok=True)
+        details.to_csv(out_file, index=False)
+        print(f"\nDetails saved to: {out_file}")
+
+    print(f"\n⏱️ Runtime of the script: {time.time() - start_time:.2f} Seconds\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import gzip
+import io
+import zipfile
+from contextlib import contextmanager
+from pathlib import Path
+
+# Model results delivered as archives are read directly, without extraction:
+#   - '.zip' files are treated like folders: 'results.zip/sub/data.csv'
+#   - '.gz' / '.zst' files are single compressed files: 'data.csv.gz'
+
+COMPRESSION_SUFFIXES = ('.gz', '.zst')
+ARCHIVE_SUFFIXES = ('.zip',) + COMPRESSION_SUFFIXES
+
+
+def strip_compression(name):
+    """Returns the file name without a '.gz'/'.zst' suffix ('data.csv.gz' -> 'data.csv')."""
+    name = str(name)
+    for suffix in COMPRESSION_SUFFIXES:
+        if name.lower().endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def split_archive_path(path):
+    """
+    Splits a path that points into a zip archive into the archive and the member.
+
+    'input/Model/results.zip/sub/data.csv' -> (Path('input/Model/results.zip'), 'sub/data.csv')
+    Paths outside a zip archive are returned as (Path(path), None).
+    """
+    parts = Path(path).parts
+    for i, part in enumerate(parts[:-1]):
+        if part.lower().endswith('.zip'):
+            return Path(*parts[:i + 1]), '/'.join(parts[i + 1:])
+    return Path(path), None
+
+
+def list_zip_members(archive, extensions):
+    """Lists all files in a zip archive whose (decompressed) extension is in extensions."""
+    with zipfile.ZipFile(archive) as zf:
+        return [
+            info.filename for info in zf.infolist()
+            if not info.is_dir() and Path(strip_compression(info.filename)).suffix.lower() in extensions
+        ]
+
+
+@contextmanager
+def open_input(path, seekable=False):
+    """
+    Opens a model result file as a binary stream, decompressing on the fly.
+    Works for plain files, members of zip archives and '.gz'/'.zst' files.
+
+    Parameters
+    ----------
+    path : str or Path
+        File path, possibly pointing into a zip archive
+    seekable : bool, optional
+        If True, non-seekable streams (zstd) are buffered in memory,
+        e.g. for reading Excel files (default False)
+    """
+    archive, member = split_archive_path(path)
+    suffix = Path(member or archive).suffix.lower()
+
+    with _open_raw(archive, member) as raw:
+        if suffix == '.gz':
+            stream = gzip.GzipFile(fileobj=raw, mode='rb')
+        elif suffix == '.zst':
+            try:
+                import zstandard
+            except ImportError:
+                raise ImportError(f"Reading '{path}' requires the 'zstandard' package (pip install zstandard).")
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        else:
+            stream = raw
+
+        if seekable and not stream.seekable():
+            stream = io.BytesIO(stream.read())
+        try:
+            yield stream
+        finally:
+            stream.close()
+
+
+@contextmanager
+def _open_raw(archive, member):
+    if member is None:
+        with open(archive, 'rb') as f:
+            yield f
+    else:
+        with zipfile.ZipFile(archive) as zf, zf.open(member) as f:
+            yield f
+
+
+def read_head(path, nbytes=65536):
+    """Reads (and decompresses) only the first nbytes of a file, e.g. for sniffing CSV headers."""
+    with open_input(path) as f:
+        return f.read(nbytes)
@@ -15,4 +15,44 @@ DICTIONARY_FILE_PATH = r'..\\dictionary_dataexplorer_variables_translation-local
 OUTPUT_FOLDER = r'..\\output'  # Ordner für Ausgabedateien
 
 #relevant für 3_import_csv:
-datei_pfad_csv = r'..\\input\\variable_info\\yaml_update.csv'
\ No newline at end of file
+datei_pfad_csv = r'..\\input\\variable_info\\yaml_update.csv'
+
+# relevant für 2_mapping_utils: Prüfung der Variablen-Hierarchie (Parent = Summe der Children)
+CHECK_HIERARCHY = True
+HIERARCHY_TOLERANCE = 1e-3  # relative Toleranz, ab der eine Abweichung gemeldet wird
+HIERARCHY_EXCLUDE = ['Price']  # Variablen (Präfix), die nicht additiv sind und nicht geprüft werden
+
+# relevant für 2_mapping_utils: einheitliches Jahresraster
+# None = Jahre wie geliefert übernehmen, sonst z.B. list(range(2020, 2051, 5))
+YEAR_GRID = None
+YEAR_GRID_METHOD = 'interpolate'  # 'interpolate' (linear) oder 'aggregate' (Mittelwert je nächstem Rasterjahr)
+
+# relevant für 2_mapping_utils: Aggregation von Regionen (z.B. EU27, Europe) aus Länderwerten
+# Sheet im Dictionary mit den Spalten 'aggregate_region' und 'member_region' (Zielnamen)
+AGGREGATE_REGIONS = True
+REGION_HIERARCHY_SHEET = 'region_aggregates'
+REGION_MIN_COVERAGE = 1.0  # Anteil der Mitgliedsregionen, die berichtet sein müssen (1.0 = alle)
+REGION_AGGREGATION_EXCLUDE = ['Price']  # Variablen (Präfix), die nicht summiert werden dürfen
+
+# relevant für 2_mapping_utils: Zusammenführen mehrerer Quellwerte auf dieselbe Zielvariable
+# pro Variable über die Spalte 'aggregation' im Sheet 'variables' (sum, mean, first, error)
+DEFAULT_AGGREGATION = 'sum'
+
+# relevant für 4_compare_outputs
+DIFF_TOLERANCE = 1e-6  # relative Toleranz, ab der ein Wert als geändert gilt
+
+# relevant für 2_mapping_utils: Aufteilen großer Ausgaben (Excel-Limit 1.048.576 Zeilen inkl. Kopfzeile)
+EXCEL_MAX_ROWS = 1048575
+
+# relevant für 2_mapping_utils: nur Teilmengen konvertieren (None = alles)
+# Quell- oder Zielnamen, '*' als Platzhalter, z.B. FILTER_SCENARIOS = ['1. W2.4*']
+# Kann auch per Kommandozeile gesetzt werden, z.B.: python konverter/2_mapping_utils.py --scenario "1. W2.4*" --year 2030 2050
+FILTER_MODELS = None
+FILTER_SCENARIOS = None
+FILTER_REGIONS = None
+FILTER_YEARS = None
+FILTER_VARIABLES = None
+
+# relevant für 2_mapping_utils: zusätzlich alle Modelle im Langformat in einen gemeinsamen
+# Parquet-Speicher schreiben (OUTPUT_FOLDER/pyam_store, partitioniert nach Modell und Szenario)
+WRITE_STORE = True
@@ -0,0 +1,67 @@
+import os
+from pathlib import Path
+from urllib.parse import quote
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Shared long-format store of all converted models (Parquet, hive partitioned):
+#   <store>/model=<model>/scenario=<scenario>/part.parquet
+# Each partition is replaced atomically, so re-runs only touch their own partitions.
+
+PARTITION_COLS = ['model', 'scenario']
+DATA_COLS = ['region', 'variable', 'unit', 'year', 'value']
+# fixed schema, so that e.g. an all-empty unit column is not written as type 'null'
+SCHEMA = pa.schema([
+    ('region', pa.string()),
+    ('variable', pa.string()),
+    ('unit', pa.string()),
+    ('year', pa.int64()),
+    ('value', pa.float64()),
+])
+
+
+def partition_dir(store, model, scenario):
+    """Directory of one model/scenario partition (names are URI-encoded)."""
+    return Path(store) / f"model={quote(str(model), safe='')}" / f"scenario={quote(str(scenario), safe='')}"
+
+
+def write_partitions(df, store):
+    """
+    Writes long IAMC data into the store, one file per model/scenario.
+    Each file is written to a temporary name first and then renamed, so
+    readers never see half-written partitions.
+
+    Returns
+    -------
+    int
+        Number of partitions written
+    """
+    n_partitions = 0
+    for (model, scenario), part in df.groupby(PARTITION_COLS, sort=False, observed=True):
+        target_dir = partition_dir(store, model, scenario)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        tmp_file = target_dir / '.part.parquet.tmp'
+        table = pa.Table.from_pandas(part[DATA_COLS], schema=SCHEMA, preserve_index=False)
+        pq.write_table(table, tmp_file)
+        os.replace(tmp_file, target_dir / 'part.parquet')
+        n_partitions += 1
+    return n_partitions
+
+
+def read_store(store, models=None, scenarios=None, columns=None):
+    """
+    Reads long IAMC data from the store. Only the partitions of the given
+    models/scenarios (target names) are opened.
+    """
+    import pyarrow.dataset as ds
+
+    dataset = ds.dataset(store, format='parquet', partitioning='hive')
+    expression = None
+    for field, values in [('model', models), ('scenario', scenarios)]:
+        if values:
+            condition = ds.field(field).isin(list(values))
+            expression = condition if expression is None else expression & condition
+    table = dataset.to_table(columns=columns, filter=expression)
+    return table.to_pandas()